@@ -2,31 +2,50 @@
 Main script for the Sustainability & Economic Performance project.
 """
 
+import argparse
+
 from src.data_preparation import build_merged_dataset
 from src.country_selection import build_50_country_panel
 from src.FE_regression import run_fe_regression
 
 
-def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the full project pipeline (modules 1 to 3).")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rebuild the merged and 50-country datasets even if they are up to date",
+    )
+    parser.add_argument(
+        "--debug-dumps",
+        action="store_true",
+        help="also save the regression dataset to data/processed/panel_FE_regression.csv "
+             "(input of notebooks/05_machine_learning.ipynb)",
+    )
+    return parser.parse_args()
+
+
+def main(force: bool = False, debug_dumps: bool = False):
     print("=" * 70)
     print("MODULE 1 — Data preparation (build merged dataset)")
     print("=" * 70)
 
-    df_full = build_merged_dataset(save=True, filename="panel_full_unfiltered.csv")
+    df_full = build_merged_dataset(save=True, filename="panel_full_unfiltered.csv", force=force)
     print("Merged dataset shape:", df_full.shape)
 
     print("\n" + "=" * 70)
     print("MODULE 2 — Country selection (build 50-country panel)")
     print("=" * 70)
 
-    df_50 = build_50_country_panel(save=True, filename="panel_50_countries.csv")
+    df_50 = build_50_country_panel(save=True, filename="panel_50_countries.csv", force=force)
     print("50-country panel shape:", df_50.shape)
 
     print("\n" + "=" * 70)
     print("MODULE 3 — Fixed-effects regression (country + year FE)")
     print("=" * 70)
 
-    run_fe_regression()
+    run_fe_regression(save=debug_dumps)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    main(force=args.force, debug_dumps=args.debug_dumps)
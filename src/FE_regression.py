@@ -10,15 +10,27 @@ This module:
            (one index for environment, another for social, and one last for governance), 
            so that we can analyse each aspect separately in the regression
         d) Combine those indexes with the economic indicators to form the dataset for the regression
-    2) Save the new dataset to data/processed/panel_FE_regression.csv
-    3) Run Country + Year fixed effects regression (clustered SE by country)
+    2) Optionally save the new dataset to data/processed/panel_FE_regression.csv
+       (input of notebooks/05_machine_learning.ipynb, not needed by the regression itself)
+    3) Run Country + Year fixed effects regression (clustered SE by country).
+       The fixed effects are absorbed by demeaning instead of estimating one dummy per country and per year:
+       alternating projections with np.bincount, then a 3-regressor OLS (Frisch-Waugh-Lovell)
     4) Save the regression table to results/regression/fixed_effects_regression.tex
 """
 
 from pathlib import Path
+import sys
 import numpy as np
 import pandas as pd
-import statsmodels.formula.api as smf
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from scipy import stats
+
+try:
+    from src._cache import up_to_date
+except ModuleNotFoundError:  # run directly as `python src/<module>.py`: make `src` importable
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from src._cache import up_to_date
 
 # ---------- Paths ----------
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -68,68 +80,70 @@ ECON_INDICATORS = [
 def load_panel_50(path: Path = PANEL_50_PATH) -> pd.DataFrame:
     if not path.exists():
         raise FileNotFoundError(f"Could not find panel_50_countries.csv at: {path}")
+
+    # prefer the Parquet copy written by country_selection.py when it is up to date with the CSV
+    parquet_path = path.with_suffix(".parquet")
+    if up_to_date((parquet_path,), path):
+        return pd.read_parquet(parquet_path, engine="pyarrow")
     return pd.read_csv(path)
 
-def build_esg_indices(df_50: pd.DataFrame) -> pd.DataFrame:
+def build_indicator_wide(df_50: pd.DataFrame) -> pd.DataFrame:
     """
-    Returns one row per (Country Name, Country Code, Year) with:
-    ENV_index, SOC_index, GOV_index
+    Reshape the long 50-country panel once into a wide table:
+    one row per (Country Name, Country Code, Year, Region, Income Group), one column per indicator.
+    Each (country, year, indicator) appears only once, so a plain unstack is enough (no aggregation).
     """
-    df_esg = df_50[df_50["Indicator"].isin(ESG_MAP.keys())].copy()
-
-    # direction and signed values
-    df_esg["direction"] = df_esg["Indicator"].map(lambda x: ESG_MAP[x]["direction"])
-    df_esg["value_signed"] = df_esg["Value"] * df_esg["direction"]
-
-    # z-score within each indicator (standardization)
-    df_esg["value_z"] = (
-        df_esg.groupby("Indicator")["value_signed"]
-        .transform(lambda x: (x - x.mean()) / x.std())
+    indicators = list(ESG_MAP.keys()) + ECON_INDICATORS
+    wide = (
+        df_50[df_50["Indicator"].isin(indicators)]
+        .set_index(["Country Name", "Country Code", "Year", "Region", "Income Group", "Indicator"])["Value"]
+        .unstack("Indicator")
     )
+    wide.columns.name = None
+    return wide
 
-    # map to ESG category
-    df_esg["ESG_category"] = df_esg["Indicator"].map(lambda x: ESG_MAP[x]["category"])
-
-    # average z within category (skipna by default via mean)
-    esg_indices = (
-        df_esg.groupby(["Country Name", "Country Code", "Year", "ESG_category"])["value_z"]
-        .mean()
-        .reset_index()
-    )
-
-    # pivot to wide format
-    esg_wide = (
-        esg_indices.pivot(
-            index=["Country Name", "Country Code", "Year"],
-            columns="ESG_category",
-            values="value_z",
-        )
-        .reset_index()
+def build_esg_indices(wide: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns one row per (Country Name, Country Code, Year) with:
+    ENV_index, SOC_index, GOV_index
+    """
+    esg_cols = [col for col in ESG_MAP if col in wide.columns]
+
+    # direction and signed values, as a (country-year x indicator) float32 matrix
+    direction = np.array([ESG_MAP[col]["direction"] for col in esg_cols], dtype=np.float32)
+    values_signed = wide[esg_cols].to_numpy(dtype=np.float32) * direction
+
+    # z-score within each indicator (standardization): the mean is computed once and the centered
+    # values are reused for both the standard deviation (ddof=1) and the z-score
+    # (an indicator with fewer than 2 observations gets a NaN std, hence NaN z-scores, as with pandas .std())
+    n_obs = (~np.isnan(values_signed)).sum(axis=0, dtype=np.float32)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centered = values_signed - np.nansum(values_signed, axis=0) / n_obs
+        std = np.sqrt(np.nansum(centered ** 2, axis=0) / (n_obs - 1))
+        std[n_obs < 2] = np.nan
+        values_z = centered / std
+
+    # average z within category (skipping missing values), as two matrix products with the
+    # (indicator x category) membership matrix: sum of the observed z / number of observed z
+    categories = [("E", "ENV_index"), ("G", "GOV_index"), ("S", "SOC_index")]
+    membership = np.array(
+        [[ESG_MAP[col]["category"] == category for category, _ in categories] for col in esg_cols],
+        dtype=np.float32,
     )
-    esg_wide.columns.name = None
+    observed = ~np.isnan(values_z)
+    with np.errstate(invalid="ignore"):  # 0/0 -> NaN when a category has no data for a country-year
+        indices = (np.where(observed, values_z, 0) @ membership) / (observed.astype(np.float32) @ membership)
 
-    esg_wide = esg_wide.rename(columns={"E": "ENV_index", "S": "SOC_index", "G": "GOV_index"})
+    esg_wide = pd.DataFrame(indices, index=wide.index, columns=[index_name for _, index_name in categories])
+    esg_wide = esg_wide.reset_index().drop(columns=["Region", "Income Group"])
     esg_wide = esg_wide.sort_values(["Country Code", "Year"]).reset_index(drop=True)
     return esg_wide
     
-def build_econ_wide(df_50: pd.DataFrame) -> pd.DataFrame:
-    df_econ = (
-        df_50[df_50["Indicator"].isin(ECON_INDICATORS)][
-            ["Country Name", "Country Code", "Year", "Indicator", "Value", "Region", "Income Group"]
-        ]
-        .copy()
-    )
+def build_econ_wide(wide: pd.DataFrame) -> pd.DataFrame:
+    econ_cols = [col for col in wide.columns if col in ECON_INDICATORS]
 
-    econ_wide = (
-        df_econ.pivot_table(
-            index=["Country Name", "Country Code", "Year", "Region", "Income Group"],
-            columns="Indicator",
-            values="Value",
-            aggfunc="mean",
-        )
-        .reset_index()
-    )
-    econ_wide.columns.name = None
+    # country-years without any economic data are not part of the regression dataset
+    econ_wide = wide[econ_cols].dropna(how="all").reset_index()
 
     econ_wide = econ_wide.rename(
         columns={
@@ -143,8 +157,9 @@ def build_econ_wide(df_50: pd.DataFrame) -> pd.DataFrame:
     return econ_wide
 
 def build_regression_dataset(df_50: pd.DataFrame) -> pd.DataFrame:
-    esg_wide = build_esg_indices(df_50)
-    econ_wide = build_econ_wide(df_50)
+    wide = build_indicator_wide(df_50)
+    esg_wide = build_esg_indices(wide)
+    econ_wide = build_econ_wide(wide)
 
     reg_df = econ_wide.merge(
         esg_wide,
@@ -158,39 +173,150 @@ def build_regression_dataset(df_50: pd.DataFrame) -> pd.DataFrame:
 
 def save_regression_dataset(reg_df: pd.DataFrame, path: Path = FE_DATASET_PATH) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    reg_df.to_csv(path, index=False)
+    pa_csv.write_csv(pa.Table.from_pandas(reg_df, preserve_index=False), path)
+    reg_df.to_parquet(path.with_suffix(".parquet"), engine="pyarrow", compression="zstd", index=False)
     print(f"FE regression dataset saved to: {path}")
 
 # ----- Country-Year Fixed Effects Regression -----
 
-def run_country_year_fe(reg_df: pd.DataFrame):
-    # Keep only vars needed for the FE model
-    fe_df = reg_df[["country_code", "Year", "gdp_growth", "ENV_index", "SOC_index", "GOV_index"]].dropna()
-
-    model = smf.ols(
-        formula="""
-            gdp_growth ~ ENV_index + SOC_index + GOV_index
-            + C(country_code)
-            + C(Year)
-        """,
-        data=fe_df,
-    ).fit(
-        cov_type="cluster", # cluster SEs at the country level to correct for within-country dependence
-        cov_kwds={"groups": fe_df["country_code"]}, 
+FE_REGRESSORS = ["ENV_index", "SOC_index", "GOV_index"]
+
+
+class _DemeanedOLS:
+    """
+    Minimal result object for _fit_demeaned_ols, exposing the
+    summary() / tidy() / to_latex() methods used by this module.
+    """
+
+    def __init__(self, coef_table: pd.DataFrame, n_obs: int, n_clusters: int):
+        self.coef_table = coef_table
+        self.n_obs = n_obs
+        self.n_clusters = n_clusters
+
+    def tidy(self) -> pd.DataFrame:
+        return self.coef_table
+
+    def summary(self) -> None:
+        print("Dep. var.: gdp_growth, Fixed effects: country_code + Year")
+        print(f"Inference:  CRV1 (clustered by country), t({self.n_clusters - 1})")
+        print("Observations: ", self.n_obs)
+        print(self.coef_table.round(3).to_string())
+
+    def to_latex(self) -> str:
+        return self.coef_table.to_latex(
+            float_format="%.3f",
+            escape=True,  # "_" in the variable names and "%" in the CI columns
+            caption=(
+                "Dependent variable: gdp\\_growth. Country and year fixed effects, "
+                "standard errors clustered by country (CRV1). "
+                f"p-values and 95\\% confidence intervals use a t distribution with G-1 = {self.n_clusters - 1} "
+                "degrees of freedom (G = number of countries; the statsmodels version of this table used the normal distribution). "
+                f"Observations: {self.n_obs:,}."
+            ),
+        )
+
+
+def _demean_twoway(X, g1, g2, n1, n2, tol=1e-8, maxiter=10_000):
+    """
+    Demean every column of X (n_obs x n_cols, float64) with respect to two groupings
+    by alternating projections: subtract the group means of each dimension until nothing changes anymore.
+
+    g1, g2: integer group codes in [0, n1) and [0, n2) for each observation
+    Raises RuntimeError if a column has not converged after maxiter iterations.
+    """
+    cnt1 = np.bincount(g1, minlength=n1)
+    cnt2 = np.bincount(g2, minlength=n2)
+    out = np.empty_like(X)
+    for j in range(X.shape[1]):
+        x = X[:, j].copy()
+        for _ in range(maxiter):
+            mean1 = np.bincount(g1, weights=x, minlength=n1) / cnt1
+            x -= mean1[g1]
+            mean2 = np.bincount(g2, weights=x, minlength=n2) / cnt2
+            x -= mean2[g2]
+            if max(np.abs(mean1).max(), np.abs(mean2).max()) < tol:
+                break
+        else:  # stopping here would return partially demeaned data, i.e. wrong coefficients
+            raise RuntimeError(f"Two-way demeaning of column {j} did not converge in {maxiter} iterations")
+        out[:, j] = x
+    return out
+
+
+def _cluster_scores(X, resid, groups, n_groups):
+    """
+    Return the (n_groups x n_cols) matrix of per-cluster scores sum_{i in g} X_i * u_i.
+    """
+    weighted = X * resid[:, None]
+    return np.column_stack(
+        [np.bincount(groups, weights=weighted[:, k], minlength=n_groups) for k in range(X.shape[1])]
     )
 
-    return model
-    
-def save_regression_table_tex(model, path: Path = FE_TABLE_TEX_PATH) -> None:
+
+def _fit_demeaned_ols(fe_df: pd.DataFrame) -> _DemeanedOLS:
+    """
+    Frisch-Waugh-Lovell: absorb the country and year FE by demeaning y and X,
+    then run OLS on the 3 ESG indices with SEs clustered by country (CRV1).
+    """
+    country_idx, countries = pd.factorize(fe_df["country_code"])
+    year_idx, years = pd.factorize(fe_df["Year"])
+    demeaned = _demean_twoway(
+        fe_df[["gdp_growth"] + FE_REGRESSORS].to_numpy(dtype=np.float64),
+        country_idx, year_idx, len(countries), len(years),
+    )
+    y, X = demeaned[:, 0], demeaned[:, 1:]
+
+    beta = np.linalg.lstsq(X, y, rcond=None)[0]
+    resid = y - X @ beta
+
+    # cluster-robust "meat": sum over countries of (X_g' u_g)(X_g' u_g)'
+    scores = _cluster_scores(X, resid, country_idx, len(countries))
+    bread = np.linalg.inv(X.T @ X)
+
+    # small-sample correction counting every FE as an estimated parameter (intercept + country + year
+    # dummies), as in the original dummy-variable regression
+    n_obs, n_clusters = len(y), len(countries)
+    n_params = X.shape[1] + len(countries) + len(years) - 1
+    small_sample = n_clusters / (n_clusters - 1) * (n_obs - 1) / (n_obs - n_params)
+    se = np.sqrt(np.diag(small_sample * bread @ (scores.T @ scores) @ bread))
+
+    # inference with t(G-1) instead of the normal distribution used by the original statsmodels fit
+    t_values = beta / se
+    t_crit = stats.t.ppf(0.975, n_clusters - 1)
+    coef_table = pd.DataFrame(
+        {
+            "Estimate": beta,
+            "Std. Error": se,
+            "t value": t_values,
+            "Pr(>|t|)": 2 * stats.t.sf(np.abs(t_values), n_clusters - 1),
+            "2.5%": beta - t_crit * se,
+            "97.5%": beta + t_crit * se,
+        },
+        index=pd.Index(FE_REGRESSORS, name="Coefficient"),
+    )
+    return _DemeanedOLS(coef_table, n_obs, n_clusters)
+
+
+def run_country_year_fe(reg_df: pd.DataFrame) -> _DemeanedOLS:
+    # Keep only vars needed for the FE model
+    # (the panel is stored in float32, the estimation itself is done in float64)
+    fe_df = reg_df[["country_code", "Year", "gdp_growth"] + FE_REGRESSORS].dropna()
+    fe_df = fe_df.astype({col: "float64" for col in ["gdp_growth"] + FE_REGRESSORS})
+
+    return _fit_demeaned_ols(fe_df)
+
+def save_regression_table_tex(model: _DemeanedOLS, path: Path = FE_TABLE_TEX_PATH) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    latex_table = model.summary().as_latex()
-    path.write_text(latex_table, encoding="utf-8")
+    path.write_text(model.to_latex(), encoding="utf-8")
     print(f"Regression table saved to: {path}")
 
 
 # ----- Function to call in main.py -----
 
-def run_fe_regression() -> None:
+def run_fe_regression(save: bool = False) -> None:
+    """
+    Build the regression dataset, fit the FE model and save the LaTeX table.
+    The regression dataset itself is only written to disk if save=True.
+    """
     print(f"Reading: {PANEL_50_PATH}")
     df_50 = load_panel_50(PANEL_50_PATH)
     print("Shape:", df_50.shape)
@@ -199,13 +325,14 @@ def run_fe_regression() -> None:
     print("Regression dataset shape:", reg_df.shape)
     print("Columns:", list(reg_df.columns))
 
-    save_regression_dataset(reg_df, FE_DATASET_PATH)
+    if save:
+        save_regression_dataset(reg_df, FE_DATASET_PATH)
 
     model = run_country_year_fe(reg_df)
-    print(model.summary())
+    model.summary()
 
     save_regression_table_tex(model, FE_TABLE_TEX_PATH)
 
 
 if __name__ == "__main__":
-    run_fe_regression()
\ No newline at end of file
+    run_fe_regression(save=True)
\ No newline at end of file
@@ -0,0 +1,20 @@
+"""
+Freshness rule shared by data_preparation.py, country_selection.py and FE_regression.py:
+used to skip a stage whose outputs are up to date, and to decide when a Parquet copy can be read instead of its CSV.
+"""
+
+from pathlib import Path
+
+
+def up_to_date(outs: tuple[Path, ...], *deps: Path) -> bool:
+    """
+    True if every output in `outs` exists and is newer than every dependency.
+
+    The stages write a CSV (the file read by the notebooks) and a Parquet copy (the file loaded back
+    when the stage is skipped): both are checked, so a stage is rebuilt as soon as either one
+    is missing or older than its inputs.
+    """
+    return all(
+        out.exists() and all(out.stat().st_mtime > dep.stat().st_mtime for dep in deps)
+        for out in outs
+    )
@@ -14,7 +14,19 @@ Important:
 """
 
 from pathlib import Path
+import sys
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+try:
+    from src._cache import up_to_date
+except ModuleNotFoundError:  # run directly as `python src/<module>.py`: make `src` importable
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from src._cache import up_to_date
+
+# copy-on-write: the filtered 50-country panel shares memory with the full panel until it is modified
+pd.set_option("mode.copy_on_write", True)
 
 
 # ---------- Paths ----------
@@ -31,7 +43,12 @@ FILE_PANEL_50 = PROCESSED_DIR / "panel_50_countries.csv"
 def load_full_panel() -> pd.DataFrame:
     """
     Load the full merged panel dataset (all countries, all indicators).
+    The Parquet copy written by data_preparation.py is preferred when it is up to date with the CSV.
     """
+    parquet_path = FILE_FULL_PANEL.with_suffix(".parquet")
+    if up_to_date((parquet_path,), FILE_FULL_PANEL):
+        return pd.read_parquet(parquet_path, engine="pyarrow")
+
     df = pd.read_csv(FILE_FULL_PANEL)
     return df
 
@@ -87,7 +104,7 @@ def select_50_countries(df: pd.DataFrame,
             "SELECTED_COUNTRY_NAMES is empty. "
         )
 
-    df_50 = df[df["Country Name"].isin(selected_names)].copy()
+    df_50 = df[df["Country Name"].isin(selected_names)]
 
     # Sanity check on the number of unique countries
     n_unique = df_50["Country Name"].nunique()
@@ -99,6 +116,7 @@ def select_50_countries(df: pd.DataFrame,
 def build_50_country_panel(
     save: bool = True,
     filename: str = "panel_50_countries.csv",
+    force: bool = False,
 ) -> pd.DataFrame:
     """
     Main function for Module 2:
@@ -106,14 +124,24 @@ def build_50_country_panel(
     - load the full merged panel
     - filter it to the selected 50 countries
     - save the filtered dataset to data/processed
+
+    If the saved panel is newer than the full panel and this module, it is loaded
+    instead of being rebuilt (unless force=True).
     """
+    out_path = PROCESSED_DIR / filename
+    cached_path = out_path.with_suffix(".parquet")
+    if not force and up_to_date((out_path, cached_path), FILE_FULL_PANEL, Path(__file__)):
+        print(f"50-country panel is up to date, loading: {cached_path}")
+        return pd.read_parquet(cached_path, engine="pyarrow")
+
     df_full = load_full_panel()
     df_50 = select_50_countries(df_full)
 
     if save:
         PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-        out_path = PROCESSED_DIR / filename
-        df_50.to_csv(out_path, index=False)
+        pa_csv.write_csv(pa.Table.from_pandas(df_50, preserve_index=False), out_path)
+        # Parquet copy, read first by FE_regression.load_panel_50
+        df_50.to_parquet(out_path.with_suffix(".parquet"), engine="pyarrow", compression="zstd", index=False)
         print(f"Saved 50-country panel to: {out_path}")
 
     return df_50
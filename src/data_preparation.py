@@ -10,14 +10,32 @@ This module:
 This will provide a country-year panel of roughly 190 countries, from which I will later choose a sample of 50 countries according to data availability and region/income level representation.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import sys
+import re
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from pandas.api.types import union_categoricals
+
+try:
+    from src._cache import up_to_date
+except ModuleNotFoundError:  # run directly as `python src/<module>.py`: make `src` importable
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from src._cache import up_to_date
+
+# copy-on-write: filtered/reshaped frames share memory with their parent until they are modified
+pd.set_option("mode.copy_on_write", True)
 
 # --------------------- Paths ---------------------
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 RAW_DIR = PROJECT_ROOT / "data" / "raw"
 PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
 
+# Repeated string columns of the long datasets, stored as pandas categoricals
+CATEGORICAL_COLS = ["Country Name", "Country Code", "Indicator", "Category", "Source"]
+
 # Raw files
 FILE_ESG = RAW_DIR / "esg-economic-data.csv"
 FILE_GDP = RAW_DIR / "gdp-inflation-fdi-data.csv"
@@ -25,70 +43,69 @@ FILE_CLASS = RAW_DIR / "country-classification.xlsx"
 
 # --------------------- Loading -------------------
 
-def load_raw_data():
-    """Load the three raw datasets from data/raw."""
+def _cached_parquet(path: Path, reader, **read_kwargs) -> pd.DataFrame:
+    """
+    Read a raw CSV/XLSX file through a Parquet cache stored in data/processed.
+    The cache is used only if it is newer than the raw file and than this module
+    (the reader arguments, e.g. usecols, are defined here), otherwise the raw file
+    is parsed again and the cache is rewritten.
+    """
+    cache_path = PROCESSED_DIR / f"{path.stem}.parquet"
+    if up_to_date((cache_path,), path, Path(__file__)):
+        return pd.read_parquet(cache_path, engine="pyarrow")
+
+    df = reader(path, **read_kwargs)
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(cache_path, engine="pyarrow", compression="zstd", index=False)
+    return df
+
+# the three raw datasets, loaded separately (in parallel) by build_merged_dataset;
+# only the columns used later are parsed (Series Code and Lending category are never used)
+def load_esg_data() -> pd.DataFrame:
+    return _cached_parquet(FILE_ESG, pd.read_csv, usecols=lambda col: col != "Series Code")
+
+def load_gdp_data() -> pd.DataFrame:
+    return _cached_parquet(FILE_GDP, pd.read_csv, usecols=lambda col: col != "Series Code")
 
-    df_esg = pd.read_csv(FILE_ESG)
-    df_gdp = pd.read_csv(FILE_GDP)
-    df_class = pd.read_excel(FILE_CLASS)
-    return df_esg, df_gdp, df_class
+def load_country_classification() -> pd.DataFrame:
+    return _cached_parquet(FILE_CLASS, pd.read_excel, usecols=["Economy", "Code", "Region", "Income group"])
 
 # ---------------------- Assign Category to ESG and Economic indicators ----------------------
 
+# keywords (case-insensitive) checked in this order; the first matching category wins
+CATEGORY_PATTERNS = [
+    ("Environmental", re.compile(r"co2|fossil|renewable|methane|nitrous", re.IGNORECASE)),
+    ("Social", re.compile(r"unemployment|gini|rights", re.IGNORECASE)),
+    ("Governance", re.compile(r"corruption|political", re.IGNORECASE)),
+    ("Economic", re.compile(r"gdp|expenditure", re.IGNORECASE)),
+]
+ECONOMIC_PATTERN = re.compile(r"gdp|inflation|foreign direct investment|research|r&d", re.IGNORECASE)
+
 def assign_category(indicator_name) -> str:
     """Assign Environmental / Social / Governance / Economic / Other to the indicators of the first dataset."""
-    indicator_name_lower = str(indicator_name).lower()
-
-    # Environmental
-    if "co2" in indicator_name_lower:
-        return "Environmental"
-    if "fossil" in indicator_name_lower:
-        return "Environmental"
-    if "renewable" in indicator_name_lower:
-        return "Environmental"
-    if "methane" in indicator_name_lower:
-        return "Environmental"
-    if "nitrous" in indicator_name_lower:
-        return "Environmental"
-
-    # Social
-    if "unemployment" in indicator_name_lower:
-        return "Social"
-    if "gini" in indicator_name_lower:
-        return "Social"
-    if "rights" in indicator_name_lower:
-        return "Social"
-
-    # Governance
-    if "corruption" in indicator_name_lower:
-        return "Governance"
-    if "political" in indicator_name_lower:
-        return "Governance"
-
-    # Economic
-    if "gdp" in indicator_name_lower:
-        return "Economic"
-    if "expenditure" in indicator_name_lower:
-        return "Economic"
+    indicator_name = str(indicator_name)
+
+    for category, pattern in CATEGORY_PATTERNS:
+        if pattern.search(indicator_name):
+            return category
 
     return "Other"
 
 def assign_economic_category(indicator_name) -> str:
     """Assign categories to GDP/Inflation/FDI indicators."""
-    indicator_name_lower = str(indicator_name).lower()
-
-    # Economic
-    if "gdp" in indicator_name_lower:
-        return "Economic"
-    if "inflation" in indicator_name_lower:
-        return "Economic"
-    if "foreign direct investment" in indicator_name_lower:
-        return "Economic"
-    if "research" in indicator_name_lower or "r&d" in indicator_name_lower:
+    if ECONOMIC_PATTERN.search(str(indicator_name)):
         return "Economic"
 
     return "Other"
 
+def map_categories(indicators: pd.Series, assign) -> pd.Series:
+    """
+    Apply an assign_* function once per distinct indicator name (about 16 of them)
+    and map the result back to every row, instead of calling it row by row.
+    """
+    category_map = {name: assign(name) for name in indicators.unique()}
+    return indicators.map(category_map)
+
 # ------------------ Cleaning the datasets ------------------
 
 def clean_esg_dataset(esg_df: pd.DataFrame) -> pd.DataFrame:
@@ -96,34 +113,36 @@ def clean_esg_dataset(esg_df: pd.DataFrame) -> pd.DataFrame:
     Clean and reshape the ESG dataset from wide to long format,
     and add a Category and Source column.
     """
-    # drop series code column (not useful for the project)
-    esg_clean = esg_df.drop(columns=["Series Code"])
-
-    # reshape the data from wide to long format
-    year_cols = [col for col in esg_clean.columns if "[" in col]
-    esg_long = esg_clean.melt(
-        id_vars=["Country Name", "Country Code", "Series Name"],
-        value_vars=year_cols,
-        var_name="Year",
-        value_name="Value",
+    # year columns look like "2000 [YR2000]": map each label to its 4-digit year once
+    year_cols = {col: int(col[:4]) for col in esg_df.columns if "[" in col}
+
+    # drop series code column (not useful for the project), if it was not already skipped when loading,
+    # drop rows without a Series Name (blank and footer lines of the export) before the melt,
+    # reshape the data from wide to long format (Year holds the mapped ints) and rename Series Name column to Indicator
+    # (no intermediate copies thanks to copy-on-write)
+    esg_long = (
+        esg_df.drop(columns=["Series Code"], errors="ignore")
+        .dropna(subset=["Series Name"])
+        .rename(columns=year_cols)
+        .melt(
+            id_vars=["Country Name", "Country Code", "Series Name"],
+            value_vars=list(year_cols.values()),
+            var_name="Year",
+            value_name="Value",
+        )
+        .rename(columns={"Series Name": "Indicator"})
+        .astype({"Year": "int16"})
     )
 
-    # rename Series Name column to Indicator
-    esg_long = esg_long.rename(columns={"Series Name": "Indicator"})
-
-    # clean Year: keep only 4 digits and convert to int
-    esg_long["Year"] = esg_long["Year"].str.slice(0, 4)
-    esg_long["Year"] = esg_long["Year"].astype(int)
-
     # assign ESG categories
-    esg_long["Category"] = esg_long["Indicator"].apply(assign_category)
-
-    # drop rows where Indicator is NaN
-    esg_long = esg_long.dropna(subset=["Indicator"])
+    esg_long["Category"] = map_categories(esg_long["Indicator"], assign_category)
 
     # label source
     esg_long["Source"] = "ESG"
 
+    # categorical dtype: small integer codes instead of one Python string per row
+    esg_long = esg_long.astype({col: "category" for col in CATEGORICAL_COLS})
+
     return esg_long
 
 def clean_gdp_dataset(gdp_df: pd.DataFrame) -> pd.DataFrame:
@@ -131,34 +150,36 @@ def clean_gdp_dataset(gdp_df: pd.DataFrame) -> pd.DataFrame:
     Clean and reshape the GDP/Inflation/FDI dataset from wide to long format,
     and add Category and Source columns.
     """
-    # drop series code column (not useful for the project)
-    gdp_clean = gdp_df.drop(columns=["Series Code"])
-
-    # reshape dataset from wide to long format
-    year_cols_gdp = [col for col in gdp_clean.columns if "[" in col]
-    gdp_long = gdp_clean.melt(
-        id_vars=["Country Name", "Country Code", "Series Name"],
-        value_vars=year_cols_gdp,
-        var_name="Year",
-        value_name="Value",
+    # year columns look like "2000 [YR2000]": map each label to its 4-digit year once
+    year_cols_gdp = {col: int(col[:4]) for col in gdp_df.columns if "[" in col}
+
+    # drop series code column (not useful for the project), if it was not already skipped when loading,
+    # drop rows without a Series Name (blank and footer lines of the export) before the melt,
+    # reshape dataset from wide to long format (Year holds the mapped ints) and rename Series Name column to Indicator
+    # (no intermediate copies thanks to copy-on-write)
+    gdp_long = (
+        gdp_df.drop(columns=["Series Code"], errors="ignore")
+        .dropna(subset=["Series Name"])
+        .rename(columns=year_cols_gdp)
+        .melt(
+            id_vars=["Country Name", "Country Code", "Series Name"],
+            value_vars=list(year_cols_gdp.values()),
+            var_name="Year",
+            value_name="Value",
+        )
+        .rename(columns={"Series Name": "Indicator"})
+        .astype({"Year": "int16"})
     )
 
-    # rename Series Name column to Indicator
-    gdp_long = gdp_long.rename(columns={"Series Name": "Indicator"})
-
-    # clean Year and convert to int
-    gdp_long["Year"] = gdp_long["Year"].str.slice(0, 4)
-    gdp_long["Year"] = gdp_long["Year"].astype(int)
-
     # assign Economic-only categories
-    gdp_long["Category"] = gdp_long["Indicator"].apply(assign_economic_category)
-
-    # drop rows where Indicator is NaN
-    gdp_long = gdp_long.dropna(subset=["Indicator"])
+    gdp_long["Category"] = map_categories(gdp_long["Indicator"], assign_economic_category)
 
     # label source
     gdp_long["Source"] = "Economic"
 
+    # categorical dtype: small integer codes instead of one Python string per row
+    gdp_long = gdp_long.astype({col: "category" for col in CATEGORICAL_COLS})
+
     return gdp_long
 
 def prepare_country_classification(class_df: pd.DataFrame) -> pd.DataFrame:
@@ -202,6 +223,13 @@ def merge_to_panel(
     esg_long = esg_long[common_cols]
     gdp_long = gdp_long[common_cols]
 
+    # give both datasets the same (sorted) categories, so that concat keeps the categorical
+    # columns as integer codes instead of materializing them back to object strings
+    for col in CATEGORICAL_COLS:
+        categories = union_categoricals([esg_long[col], gdp_long[col]], sort_categories=True).categories
+        esg_long[col] = esg_long[col].cat.set_categories(categories)
+        gdp_long[col] = gdp_long[col].cat.set_categories(categories)
+
     # combine ESG + GDP
     all_long = pd.concat([esg_long, gdp_long], ignore_index=True)
 
@@ -210,21 +238,25 @@ def merge_to_panel(
         ["Country Code", "Year", "Category"]
     ).reset_index(drop=True)
 
-    # merge with the country classification dataset
-    panel_long = all_long.merge(
-        class_clean,
-        on="Country Code",
-        how="left",
+    # attach Region and Income Group from the country classification dataset:
+    # one dictionary lookup per row instead of a full merge (the Country Name of the
+    # ESG/GDP datasets is kept, as before)
+    classification = class_clean.dropna(subset=["Country Code"]).set_index("Country Code")
+    panel_long = all_long.assign(
+        **{
+            col: all_long["Country Code"].map(classification[col].to_dict())
+            for col in ["Region", "Income Group"]
+        }
     )
 
-    # clean up duplicate country name columns
-    if "Country Name_x" in panel_long.columns:
-        panel_long = panel_long.rename(columns={"Country Name_x": "Country Name"})
-        panel_long = panel_long.drop(columns=["Country Name_y"])
-
-    # Convert Value column to numeric (turn "." into NaN)
+    # Convert Value column to numeric (turn "." into NaN). Kept in float64: this panel is written to disk
+    # and read by the notebooks, so it keeps the full precision of the raw data (FE_regression.py
+    # downcasts to float32 only for the ESG index computation)
     panel_long["Value"] = pd.to_numeric(panel_long["Value"], errors="coerce")
 
+    # the classification columns come out of the lookup as object strings
+    panel_long = panel_long.astype({"Region": "category", "Income Group": "category"})
+
     return panel_long
 
 # ------------- Main data preparation function -------------
@@ -232,27 +264,44 @@ def merge_to_panel(
 def build_merged_dataset(
     save: bool = True,
     filename: str = "panel_full_unfiltered.csv",
+    force: bool = False,
 ) -> pd.DataFrame:
     """
     High-level function that:
     - loads raw data
     - cleans and reshapes ESG + GDP
     - prepares country classification
+      (these three steps run concurrently)
     - merges everything into one panel_long DataFrame
     - saves the new dataset to data/processed
-    """
-    df_esg, df_gdp, df_class = load_raw_data()
 
-    esg_long = clean_esg_dataset(df_esg)
-    gdp_long = clean_gdp_dataset(df_gdp)
-    class_clean = prepare_country_classification(df_class)
+    If the saved dataset is newer than the raw files and this module, it is loaded
+    instead of being rebuilt (unless force=True).
+    """
+    out_path = PROCESSED_DIR / filename
+    cached_path = out_path.with_suffix(".parquet")
+    if not force and up_to_date((out_path, cached_path), FILE_ESG, FILE_GDP, FILE_CLASS, Path(__file__)):
+        print(f"Merged dataset is up to date, loading: {cached_path}")
+        return pd.read_parquet(cached_path, engine="pyarrow")
+
+    # the three datasets are independent (different files, no shared state):
+    # load and clean them in parallel threads (parsing and most pandas operations release the GIL)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        esg_future = executor.submit(lambda: clean_esg_dataset(load_esg_data()))
+        gdp_future = executor.submit(lambda: clean_gdp_dataset(load_gdp_data()))
+        class_future = executor.submit(lambda: prepare_country_classification(load_country_classification()))
+
+    esg_long = esg_future.result()
+    gdp_long = gdp_future.result()
+    class_clean = class_future.result()
 
     panel_long = merge_to_panel(esg_long, gdp_long, class_clean)
 
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
     if save:
-        out_path = PROCESSED_DIR / filename
-        panel_long.to_csv(out_path, index=False)
+        pa_csv.write_csv(pa.Table.from_pandas(panel_long, preserve_index=False), out_path)
+        # Parquet copy, read first by country_selection.load_full_panel
+        panel_long.to_parquet(out_path.with_suffix(".parquet"), engine="pyarrow", compression="zstd", index=False)
         print(f"Saved merged dataset to: {out_path}")
 
     return panel_long